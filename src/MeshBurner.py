@@ -1,8 +1,8 @@
 ﻿""" 
 Iteratively burns the perimeter of a mesh. Similar to the Grassfire transform 
 used in image processing for extracting the medial axis on a raster. Outputs 
-each burn front as an individual mesh. Note: Has not been optimized for
-performance.
+each burn front as an individual mesh. The burn fronts are found in a single
+breadth first walk from the naked faces inwards.
 -
 Name: MeshBurner
 Updated: 141008
@@ -23,50 +23,107 @@ import Rhino as rc
 ghenv.Component.Name = "MeshBurner"
 ghenv.Component.NickName = "MB"
 
-def getNakedFaceIDs(mesh):
+def getFaceTable(mesh):
+    
+    """ Return the vertex indices of all faces as one flat list with four
+    indices per face (triangles repeat their last vertex) """
+    
+    return list(mesh.Faces.ToIntArray(False))
+
+def getVertexFaceTable(mesh,faceTable):
+    
+    """ Return the topology vertex indices of the face table and the faces of
+    each topology vertex as a compressed sparse row table, where the faces of
+    topology vertex i are faceIDs[rowStarts[i]:rowStarts[i+1]] """
+    
+    # Map the face table to topology vertices
+    tvIDs = [mesh.TopologyVertices.TopologyVertexIndex(i) for i in range(mesh.Vertices.Count)]
+    topoTable = [tvIDs[v] for v in faceTable]
+    
+    # Count the faces of each topology vertex (skipping repeated triangle vertices)
+    rowStarts = [0]*(mesh.TopologyVertices.Count + 1)
+    for k,tv in enumerate(topoTable):
+        if k%4 != 3 or tv != topoTable[k-1]:
+            rowStarts[tv+1] += 1
+    for i in range(1,len(rowStarts)):
+        rowStarts[i] += rowStarts[i-1]
+        
+    # Fill in the face indices of each topology vertex
+    faceIDs = [0]*rowStarts[-1]
+    fill = rowStarts[:-1]
+    for k,tv in enumerate(topoTable):
+        if k%4 != 3 or tv != topoTable[k-1]:
+            faceIDs[fill[tv]] = k//4
+            fill[tv] += 1
+            
+    return topoTable,rowStarts,faceIDs
+
+def getNakedFaceIDs(mesh,faceTable):
     
     """ Return the face indices of any face with a naked vertex """
     
+    # Get naked status of each vertex
+    naked = list(mesh.GetNakedEdgePointStatus())
+    
+    # Check if any face vertex is naked
     nakedFaces = []
+    for k in range(0,len(faceTable),4):
+        if (naked[faceTable[k]] or naked[faceTable[k+1]] or
+            naked[faceTable[k+2]] or naked[faceTable[k+3]]):
+            nakedFaces.append(k//4)
+            
+    return nakedFaces
+
+def getBurnLayers(mesh,faceTable):
+    
+    """ Return the burn front index of each face by walking inwards from the
+    naked faces over faces that share a vertex (-1 if it is never reached) """
     
-    # Get naked vertices
-    nPts = list( mesh.GetNakedEdgePointStatus())
-    nIDs = [i for i,v in enumerate(nPts) if v == True]
+    # Get the topology vertices of each face and the faces of each topology vertex
+    topoTable,rowStarts,faceIDs = getVertexFaceTable(mesh,faceTable)
     
-    for i in range(mesh.Faces.Count):
+    # The naked faces make up the first burn front
+    layers = [-1]*mesh.Faces.Count
+    front = getNakedFaceIDs(mesh,faceTable)
+    for i in front:
+        layers[i] = 0
         
-        # Get face vertices
-        f = mesh.Faces.Item[i]
-        if f.IsTriangle:
-            vts = (f.A,f.B,f.C)
-        else:
-            vts = (f.A,f.B,f.C,f.D)
+    # Faces sharing a vertex with the current front make up the next front
+    layer = 0
+    while front:
+        layer += 1
+        nextFront = []
+        for i in front:
+            for tv in topoTable[4*i:4*i+4]:
+                for j in faceIDs[rowStarts[tv]:rowStarts[tv+1]]:
+                    if layers[j] == -1:
+                        layers[j] = layer
+                        nextFront.append(j)
+        front = nextFront
         
-        # Check if they are naked
-        naked = False
-        for vt in vts:
-            if vt in nIDs:
-                naked = True
-                
-        if naked:
-            nakedFaces.append(i)
-            
-    return nakedFaces
+    return layers
 
 def meshBurner(mesh):
     
     """ Dicretize a mesh using a grassfire algorithm """
     
+    # Group the face indices by burn front
+    layers = getBurnLayers(mesh,getFaceTable(mesh))
+    layerFaceIDs = [[] for i in range(max(layers + [-1]) + 1)]
+    for i,l in enumerate(layers):
+        if l > -1:
+            layerFaceIDs[l].append(i)
+            
     burnFronts = []
-    while mesh.Faces.Count:
+    vertices = mesh.Vertices.ToPoint3fArray()
+    for fIDs in layerFaceIDs:
         
         # Make burn front mesh and add vertices to it
         bm = rc.Geometry.Mesh()
-        bm.Vertices.AddVertices(mesh.Vertices.ToPoint3fArray())
+        bm.Vertices.AddVertices(vertices)
         
-        # Add the burn perimeter to the mesh
-        nfIDs = getNakedFaceIDs(mesh)
-        nf = [mesh.Faces.Item[i] for i in nfIDs]
+        # Add the burn front faces to the mesh
+        nf = [mesh.Faces.Item[i] for i in fIDs]
         bm.Faces.AddFaces(nf)
         
         # Compact and append to output list
@@ -74,9 +131,6 @@ def meshBurner(mesh):
         bm.Normals.ComputeNormals()
         burnFronts.append(bm)
         
-        # Delete the burned faces
-        mesh.Faces.DeleteFaces(nfIDs)
-        
     return burnFronts
 
 if Mesh:
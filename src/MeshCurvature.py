@@ -3,7 +3,9 @@ Analyse mesh curvature. Curvature is defined here as the angle between a vertex
 and the vector from this vertex to its neighbours. Zero curvature is thus equal to
 90 degrees. However to evaluate positive and negative curvatures 90 is subtracted
 from this value. Meaning that negative curvature will be a negative value and
-positive curvature a positive value.
+positive curvature a positive value. Alternatively the "gaussian" mode calculates
+the discrete Gaussian curvature, which is the angle defect at each vertex divided
+by its share of the area of the surrounding faces.
 -
 Name: MeshCurvature
 Updated: 140818
@@ -15,7 +17,7 @@ Contact: adel@kadk.dk
     Args:
         Toggle: Activates the component.
         Mesh: The mesh to analyse.
-        Mode: The curvature mode to calculate ("min","max" or "mean").
+        Mode: The curvature mode to calculate ("min","max","mean" or "gaussian").
         Angle: The angle in degrees at which the mesh is unwelded.
         NegativeOff: If True negative curvature is treated as if positive.
     Returns:
@@ -29,6 +31,8 @@ Contact: adel@kadk.dk
 """
 
 import Rhino as rc
+import System
+import System.Drawing
 import math
 
 
@@ -36,100 +40,193 @@ import math
 ghenv.Component.Name = "MeshCurvatureAnalysis"
 ghenv.Component.NickName = "MeshCurvature"
 
+def minAngles(vertexIDs,angles,counts):
+    
+    """ Return the smallest angle at each vertex """
+    
+    curvature = [float("inf")]*len(counts)
+    for i,a in zip(vertexIDs,angles):
+        if a < curvature[i]:
+            curvature[i] = a
+    return [c if n else 0.0 for c,n in zip(curvature,counts)]
+
+def maxAngles(vertexIDs,angles,counts):
+    
+    """ Return the largest angle at each vertex """
+    
+    curvature = [float("-inf")]*len(counts)
+    for i,a in zip(vertexIDs,angles):
+        if a > curvature[i]:
+            curvature[i] = a
+    return [c if n else 0.0 for c,n in zip(curvature,counts)]
+
+def meanAngles(vertexIDs,angles,counts):
+    
+    """ Return the mean angle at each vertex """
+    
+    curvature = [0.0]*len(counts)
+    for i,a in zip(vertexIDs,angles):
+        curvature[i] += a
+    return [s/n if n else 0.0 for s,n in zip(curvature,counts)]
+
+# Functions reducing edge angles to vertex curvature for each mode
+angleReducers = {"min":minAngles,"max":maxAngles,"mean":meanAngles}
+
 def meshCurvature(mesh,mode,negativeOff):
     
     """ Calculate the curvature of a mesh using vertex normal angle 
     from each vertex to its neighbours """
     
+    # Get the reduction for the curvature mode
+    reduceAngles = angleReducers[mode]
+    
     # Calculate mesh normals
     mesh.FaceNormals.ComputeFaceNormals()
     mesh.Normals.ComputeNormals()
     
-    # Output list
-    curvature = []
+    # Get vertices and unitized vertex normals as coordinate lists (one pass each)
+    vertices = mesh.Vertices.ToPoint3fArray()
+    vx = [v.X for v in vertices]
+    vy = [v.Y for v in vertices]
+    vz = [v.Z for v in vertices]
+    nx,ny,nz = [],[],[]
+    for n in mesh.Normals:
+        l = math.sqrt(n.X*n.X + n.Y*n.Y + n.Z*n.Z) or 1.0
+        nx.append(n.X/l)
+        ny.append(n.Y/l)
+        nz.append(n.Z/l)
+    vCount = len(vertices)
     
-    # Iterate mesh vertices
-    for i in range(mesh.Vertices.Count):
-        
-        # Get vertex, vertex normal and vertex neighbour IDs
-        centerVertex = mesh.Vertices.Item[i]
-        centerNormal = mesh.Normals.Item[i]
-        neighbourIDs = mesh.Vertices.GetConnectedVertices(i)
-        
-        # Iterate neighbouring vertices
-        angles = []
-        for j in neighbourIDs:
+    # Calculate the angle between the vertex normal and each edge
+    edgeIDs = []
+    angles = []
+    for i in range(vCount):
+        for j in mesh.Vertices.GetConnectedVertices(i):
             
             # Make vector from vertex to neighbour and check its length
-            neighbourVertex = mesh.Vertices.Item[j]
-            neighbourDirection = neighbourVertex - centerVertex
-            if neighbourDirection.Length > 0:
-                
-                # Calculate angle between normal and new vector
-                a = rc.Geometry.Vector3d.VectorAngle(centerNormal,neighbourDirection)
+            dx = vx[j] - vx[i]
+            dy = vy[j] - vy[i]
+            dz = vz[j] - vz[i]
+            l = math.sqrt(dx*dx + dy*dy + dz*dz)
+            if l > 0:
                 
-                # Subtract it from 90 and optionally get absolute value (no negative curvature)
-                a = math.degrees(a) - 90
-                if negativeOff:
-                    a = abs(a)
-                    
-                # Add to list
-                angles.append(a)
+                # Calculate angle between normal and edge and subtract it from 90
+                c = (nx[i]*dx + ny[i]*dy + nz[i]*dz)/l
+                edgeIDs.append(i)
+                angles.append(math.degrees(math.acos(max(-1.0,min(1.0,c)))) - 90)
                 
-        # Calculate curvature depending on mode
-        if mode == "min":
-            curvature.append(min(angles))
+    # Optionally get absolute values (no negative curvature)
+    if negativeOff:
+        angles = [abs(a) for a in angles]
+        
+    # Count the (non-zero length) edges of each vertex
+    counts = [0]*vCount
+    for i in edgeIDs:
+        counts[i] += 1
+        
+    # Reduce edge angles to vertex curvature depending on mode
+    return reduceAngles(edgeIDs,angles,counts)
+
+def meshGaussianCurvature(mesh,negativeOff):
+    
+    """ Calculate the Gaussian curvature of a mesh as the angle defect at
+    each vertex divided by a third (quarter for quads) of its face areas """
+    
+    # Get topology vertices, so that unwelded vertices are treated as one
+    tvs = mesh.TopologyVertices
+    tvCount = tvs.Count
+    px = [v.X for v in tvs]
+    py = [v.Y for v in tvs]
+    pz = [v.Z for v in tvs]
+    tvIDs = [tvs.TopologyVertexIndex(i) for i in range(mesh.Vertices.Count)]
+    
+    # Get naked topology vertices
+    naked = [False]*tvCount
+    for i,n in enumerate(mesh.GetNakedEdgePointStatus()):
+        if n:
+            naked[tvIDs[i]] = True
             
-        elif mode == "max":
-            curvature.append(max(angles))
+    # Accumulate face corner angles and face areas at the face vertices
+    angleSums = [0.0]*tvCount
+    areas = [0.0]*tvCount
+    for i in range(mesh.Faces.Count):
+        
+        # Get face vertices (triangles have their last vertex repeated)
+        fvs = list(mesh.Faces.GetTopologicalVertices(i))
+        if fvs[2] == fvs[3]:
+            fvs = fvs[:3]
+        n = len(fvs)
+        
+        # Calculate the angle and the triangle area at each corner
+        cornerAreas = 0.0
+        for k in range(n):
+            a,b,c = fvs[k],fvs[(k+1)%n],fvs[k-1]
+            ux,uy,uz = px[b]-px[a],py[b]-py[a],pz[b]-pz[a]
+            wx,wy,wz = px[c]-px[a],py[c]-py[a],pz[c]-pz[a]
+            lu = math.sqrt(ux*ux + uy*uy + uz*uz)
+            lw = math.sqrt(wx*wx + wy*wy + wz*wz)
+            if lu > 0 and lw > 0:
+                cs = (ux*wx + uy*wy + uz*wz)/(lu*lw)
+                angleSums[a] += math.acos(max(-1.0,min(1.0,cs)))
+            cx,cy,cz = uy*wz-uz*wy,uz*wx-ux*wz,ux*wy-uy*wx
+            cornerAreas += 0.5*math.sqrt(cx*cx + cy*cy + cz*cz)
             
-        elif mode == "mean":
-            curvature.append(sum(angles)/len(angles))
+        # Corner triangles cover a triangle three times and a quad twice
+        faceArea = cornerAreas/(2.0 if n == 4 else 3.0)
+        for a in fvs:
+            areas[a] += faceArea/n
             
-    return curvature
+    # Calculate the angle defect (boundary vertices are measured against pi)
+    tvCurvature = []
+    for a,s,nk in zip(areas,angleSums,naked):
+        k = ((math.pi if nk else 2*math.pi) - s)/a if a > 0 else 0.0
+        if negativeOff:
+            k = abs(k)
+        tvCurvature.append(k)
+        
+    # Return curvature for each mesh vertex
+    return [tvCurvature[i] for i in tvIDs]
 
 def remapValues(values,targetMin,targetMax):
     
     """ Remap numbers into a new numeric domain """
     
-    # Check that different values exist
-    if len(set(values)) > 1:
-        
-        remappedValues = []
-        
-        # Get sourceDomain min and max
-        srcMin = min(values)
-        srcMax = max(values)
-        
-        # Iterate the values and remap them
-        for v in values:
-            rv = ((v-srcMin)/(srcMax-srcMin))*(targetMax-targetMin)+targetMin
-            remappedValues.append(rv)
-            
-        return remappedValues
+    # Get sourceDomain min and max
+    srcMin = min(values) if values else 0.0
+    srcMax = max(values) if values else 0.0
+    
+    # Check that different values exist and remap them
+    if srcMax > srcMin:
+        scale = (targetMax-targetMin)/float(srcMax-srcMin)
+        return [(v-srcMin)*scale+targetMin for v in values]
         
-    # Else return targetMax for each value
+    # Else return targetMin for each value
     else:
         return [targetMin]*len(values)
 
-def mapValueListAsColors(values):
+def mapValueListAsColors(values,lutSize=1024):
     
     """ Make a list of HSL color where the values are mapped onto a
     0.0 - 0.7 hue domain. Meaning that low values will be red, medium
-    values green and large values blue """
+    values green and large values blue. When there are more values than
+    lutSize, they are mapped onto a lookup table of lutSize colors
+    sampled along the hue domain instead """
     
-    colors = []
-    remappedValues = remapValues(values,0.0,0.7)
-    for v in remappedValues:
-        c = rc.Display.ColorHSL(v,1.0,0.5).ToArgbColor()
-        colors.append(c)
+    # Make a color for each value if there are few of them
+    if len(values) <= lutSize:
+        remappedValues = remapValues(values,0.0,0.7)
+        return [rc.Display.ColorHSL(v,1.0,0.5).ToArgbColor() for v in remappedValues]
         
-    return colors
+    # Else make lookup table of colors along the hue domain
+    lut = [rc.Display.ColorHSL(0.7*i/(lutSize-1),1.0,0.5).ToArgbColor() for i in range(lutSize)]
+    
+    # Remap values to lookup table indices and get their colors
+    remappedValues = remapValues(values,0.0,lutSize-1)
+    return [lut[int(v+0.5)] for v in remappedValues]
 
 def colorMesh(mesh,colors):
-    """ Color mesh vertices by list of colors """
-    for i,c in enumerate(colors):
-        mesh.VertexColors.SetColor(i,c)
+    """ Color mesh vertices by list of colors (in one call) """
+    mesh.VertexColors.SetColors(System.Array[System.Drawing.Color](colors))
 
 # Calls and GH output
 if Toggle:
@@ -139,10 +236,13 @@ if Toggle:
         Mesh.Unweld(math.radians(Angle),True)
         
         # Calculate curvature, sorted values, sum etc,
-        Curvature = meshCurvature(Mesh,Mode,NegativeOff)
+        if Mode == "gaussian":
+            Curvature = meshGaussianCurvature(Mesh,NegativeOff)
+        else:
+            Curvature = meshCurvature(Mesh,Mode,NegativeOff)
         CurvatureSorted = sorted(Curvature)
         CurvatureSum = round(sum(Curvature),2)
-        CurvatureBounds = (round(min(Curvature),2)),(round(max(Curvature),2))
+        CurvatureBounds = (round(CurvatureSorted[0],2)),(round(CurvatureSorted[-1],2))
         
         # Calculate colors and color mesh
         Colors = mapValueListAsColors(Curvature)
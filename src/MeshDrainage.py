@@ -16,6 +16,7 @@ Geometric drainage simulation model for analysing a mesh for pooling of rain wat
 """
 
 import Rhino as rc
+import math
 import random
 import System.Threading.Tasks as tasks
 import Grasshopper.Kernel.Types as gkt
@@ -24,49 +25,78 @@ import Grasshopper.Kernel.Types as gkt
 ghenv.Component.Name = "MeshDrainagePaths"
 ghenv.Component.NickName = "MDP"
 
+def downSlopeStep(pt,n,stepSize):
+    
+    """ Move a point a step size down slope on a plane with normal n, by
+    projecting -Z onto the plane. Returns None if the plane is flat """
+    
+    # Project -Z onto the plane (i.e. subtract its normal component)
+    nn = n.X*n.X + n.Y*n.Y + n.Z*n.Z
+    if not nn:
+        return None
+    k = n.Z/nn
+    dx,dy,dz = n.X*k,n.Y*k,n.Z*k - 1.0
+    
+    # Scale the projected direction to the step size
+    dl = math.sqrt(dx*dx + dy*dy + dz*dz)
+    if dl <= rc.RhinoMath.ZeroTolerance:
+        return None
+    s = stepSize/dl
+    return rc.Geometry.Point3d(pt.X + dx*s,pt.Y + dy*s,pt.Z + dz*s)
+
 def makeDrainMeshPaths(mesh,startPoints,maxSteps,stepSize,threaded):
     
     """ Estimates drainage paths on a mesh. Based on Benjamin Golders concept
     found here: www.grasshopper3d.com/forum/topics/drainage-direction-script """
     
-    # Return list
-    drainPaths = []
+    # Return list with a slot for each particle path
+    drainPaths = [None]*len(startPoints)
+    
+    # Particles are moved a step size from a point on the mesh, so the closest
+    # mesh point search can be bounded by this (with a bit of slack)
+    searchDistance = abs(stepSize)*1.5
+    
+    # Get face normals once
+    mesh.FaceNormals.ComputeFaceNormals()
+    faceNormals = list(mesh.FaceNormals)
     
     # Task function
-    def drainPath(pt):
+    def drainPath(i):
         
-        # Make particle list and set current particle plane
+        # Make particle list and set current particle position
         particles = []
-        paPl = rc.Geometry.Plane(pt,rc.Geometry.Vector3d.ZAxis)
-        for i in range(maxSteps):
+        pt = startPoints[i]
+        for j in range(maxSteps):
             
             # Get point on mesh closest to current particle position
-            meshPt = mesh.ClosestMeshPoint(paPl.Origin,0.00)
+            meshPt = mesh.ClosestMeshPoint(pt,searchDistance)
             if meshPt:
-                paPl = rc.Geometry.Plane(meshPt.Point,mesh.NormalAt(meshPt))
+                pt = meshPt.Point
                 
                 # Check first step has been taken and that current step is down slope
-                if i and paPl.Origin.Z > particles[-1].Z:
+                if j and pt.Z > particles[-1].Z:
                     break
-                else:
-                    # Record particle position and move down slope
-                    particles.append(paPl.Origin)
-                    an = rc.Geometry.Vector3d.VectorAngle(paPl.XAxis,-rc.Geometry.Vector3d.ZAxis,paPl)
-                    paPl.Rotate(an,paPl.ZAxis)
-                    paPl.Translate(paPl.XAxis*stepSize)
                     
+                # Record particle position and move down slope
+                particles.append(pt)
+                pt = downSlopeStep(pt,faceNormals[meshPt.FaceIndex],stepSize)
+                
+                # Stop on flat areas (where water pools)
+                if pt is None:
+                    break
+                
         # Make drain polyline
         if len(particles) > 1:
-            pl = rc.Geometry.Polyline(particles)
-            drainPaths.append(pl)
-                
+            drainPaths[i] = rc.Geometry.Polyline(particles)
+            
     # Call task function (use non-threaded for debugging)
     if threaded:
-        tasks.Parallel.ForEach(startPoints,drainPath)
+        tasks.Parallel.For(0,len(startPoints),drainPath)
     else:
-        [drainPath(pt) for pt in startPoints]
-        
-    return drainPaths
+        for i in range(len(startPoints)):
+            drainPath(i)
+            
+    return [pl for pl in drainPaths if pl is not None]
 
 if Mesh:
     
@@ -79,6 +109,6 @@ if Mesh:
     
     # Make paths and output to GH
     drainagePaths = makeDrainMeshPaths(Mesh,vts,int(MaxSteps),StepSize,Threaded)
-    DrainagePaths = [gkt.GH_Curve(pl.ToNurbsCurve()) for pl in drainagePaths]
+    DrainagePaths = [gkt.GH_Curve(rc.Geometry.PolylineCurve(pl)) for pl in drainagePaths]
 else:
     DrainagePaths = []
@@ -28,6 +28,7 @@ Contact: adel@kadk.dk
 import copy
 import Rhino as rc
 import networkx as nx
+import System.Threading.Tasks as tasks
 
 def meshVertexGraph(mesh,weightMode):
     
@@ -36,24 +37,33 @@ def meshVertexGraph(mesh,weightMode):
     # Create graph
     g = nx.Graph()
     
-    for i in range(mesh.Vertices.Count):
-        
-        # Get vertex as point3D
-        pt3D = rc.Geometry.Point3d(mesh.Vertices.Item[i])
-        
-        # Add node to graph and get its neighbours
+    # Add vertices to graph as point3D nodes
+    vertices = list(mesh.Vertices.ToPoint3dArray())
+    g.graph["points"] = vertices
+    for i,pt3D in enumerate(vertices):
         g.add_node(i,point=pt3D)
-        neighbours = mesh.Vertices.GetConnectedVertices(i)
         
-        # Add edges to graph
-        for n in neighbours:
-            if n > i:
-                line = rc.Geometry.Line(mesh.Vertices.Item[i],mesh.Vertices.Item[n])
-                if weightMode == "edgeLength":
-                    w = line.Length
-                elif weightMode == "sameWeight":
-                    w = 1
-                g.add_edge(i,n,weight=w,line=line)
+    # Get unique edges from the topology edges, connecting every mesh vertex
+    # at each end so that the graph stays connected across unwelded seams
+    edges = set()
+    tvs = mesh.TopologyVertices
+    for e in range(mesh.TopologyEdges.Count):
+        ends = mesh.TopologyEdges.GetTopologyVertices(e)
+        for i in tvs.MeshVertexIndices(ends.I):
+            for n in tvs.MeshVertexIndices(ends.J):
+                if i < n:
+                    edges.add((i,n))
+                elif n < i:
+                    edges.add((n,i))
+                    
+    # Add edges to graph
+    for i,n in sorted(edges):
+        if weightMode == "edgeLength":
+            w = vertices[i].DistanceTo(vertices[n])
+        elif weightMode == "sameWeight":
+            w = 1
+        g.add_edge(i,n,weight=w)
+        
     return g
 
 def meshFacesGraph(mesh,weightMode):
@@ -64,65 +74,89 @@ def meshFacesGraph(mesh,weightMode):
     # Create graph
     g = nx.Graph()
     
-    for i in range(mesh.Faces.Count):
+    # Get face centers
+    centers = [mesh.Faces.GetFaceCenter(i) for i in range(mesh.Faces.Count)]
+    g.graph["points"] = centers
+    
+    for i,center in enumerate(centers):
         
         # Add node to graph and get its neighbours
-        g.add_node(i,point=mesh.Faces.GetFaceCenter(i))
+        g.add_node(i,point=center)
         neighbours = mesh.Faces.AdjacentFaces(i)
         
         # Add edges to graph
         for n in neighbours:
             if n > i:
-                line = rc.Geometry.Line(mesh.Faces.GetFaceCenter(i),mesh.Faces.GetFaceCenter(n))
                 if weightMode == "edgeLength":
-                    w = line.Length
+                    w = center.DistanceTo(centers[n])
                 elif weightMode == "sameWeight":
                     w = 1
-                g.add_edge(i,n,weight=w,line=line)
+                g.add_edge(i,n,weight=w)
                 
     return g
 
-def hasPath(graph,source,target):
+def closestNodes(g,points):
     
-    """ Return True if graph has a path from source to target, False otherwise """
+    """ Return the index of the graph node closest to each point, using
+    one node point list for all the points """
     
+    nPts = rc.Collections.Point3dList(g.graph["points"])
+    return [nPts.ClosestIndex(pt) for pt in points]
+
+def shortestWalk(g,start,end):
+    
+    # Calculate shortest path (if one exists between the two nodes)
     try:
-        sp = nx.shortest_path(graph,source,target)
+        sp = nx.shortest_path(g,start,end,weight = "weight")
     except nx.NetworkXNoPath:
-        return False
-    return True
+        return None
+        
+    # Make polyline through path
+    pts = [g.graph["points"][i] for i in sp]
+    pl = rc.Geometry.PolylineCurve(pts)
+    
+    return pl
 
-def shortestWalk(g,line,mode):
+def dijkstraWalks(g,starts,ends,threaded):
     
-    # Get index of closest nodes to line endpoints
-    nPts = [g.node[n]["point"] for n in g]
-    nPts = rc.Collections.Point3dList(nPts)
-    start = nPts.ClosestIndex(line.From)
-    end = nPts.ClosestIndex(line.To)
+    """ Calculate the shortest path between each start and end node running
+    only one Dijkstra search per unique start node """
     
-    # Check that start and are not the same node
-    if start == end:
-        
-        print "Start and end node is the same"
+    # Calculate predecessors from each unique start node to all other nodes
+    uniqueStarts = list(set(starts))
+    startPreds = [None]*len(uniqueStarts)
+    def startPred(i):
+        startPreds[i] = nx.dijkstra_predecessor_and_distance(g,uniqueStarts[i],weight = "weight")[0]
         
+    # Call task function (use non-threaded for debugging)
+    if threaded:
+        tasks.Parallel.For(0,len(uniqueStarts),startPred)
     else:
+        for i in range(len(uniqueStarts)):
+            startPred(i)
+    preds = dict(zip(uniqueStarts,startPreds))
+    
+    walks = []
+    for start,end in zip(starts,ends):
         
-        # Check that a path exist between the two nodes
-        if hasPath(g,start,end):
+        # Check that start and are not the same node and that a path exists
+        pred = preds[start]
+        if start == end or end not in pred:
+            walks.append(None)
             
-            # Calculate shortest path
+        else:
+            
+            # Walk the predecessors back from the end node
+            sp = [end]
+            while sp[-1] != start:
+                sp.append(pred[sp[-1]][0])
+            sp.reverse()
             
-            if mode == "dijkstra_path":
-                sp = nx.dijkstra_path(g,start,end,weight = "weight")
-                
-            elif mode == "shortest_path":
-                sp = nx.shortest_path(g,start,end,weight = "weight")
-                
             # Make polyline through path
-            pts = [g.node[i]["point"] for i in sp]
-            pl = rc.Geometry.PolylineCurve(pts)
+            pts = [g.graph["points"][i] for i in sp]
+            walks.append(rc.Geometry.PolylineCurve(pts))
             
-            return pl
+    return walks
 
 
 # Check input geometry
@@ -134,13 +168,35 @@ if Mesh and Destinations:
     else:
         g = meshFacesGraph(Mesh,WeightMode)
         
-    # Calculate shortest paths
-    Paths = []
+    # Get the nodes closest to the start and end of each destination line
+    endPts = []
     for l in Destinations:
-        sp = shortestWalk(g,l,PathMode)
-        Paths.append(sp)
+        endPts.extend((l.From,l.To))
+    endIDs = closestNodes(g,endPts)
+    
+    # Check that start and end are not the same node
+    starts,ends = endIDs[0::2],endIDs[1::2]
+    for start,end in zip(starts,ends):
+        if start == end:
+            print "Start and end node is the same"
+            
+    # Calculate shortest paths (multithreaded only if there are several searches to run)
+    if PathMode == "dijkstra_path":
+        Paths = dijkstraWalks(g,starts,ends,len(set(starts)) > 1)
+    elif PathMode == "shortest_path":
+        Paths = [None]*len(starts)
+        def walk(i):
+            if starts[i] != ends[i]:
+                Paths[i] = shortestWalk(g,starts[i],ends[i])
+                
+        # Call task function (a single destination runs non-threaded, e.g. for debugging)
+        if len(starts) > 1:
+            tasks.Parallel.For(0,len(starts),walk)
+        else:
+            for i in range(len(starts)):
+                walk(i)
         
     # Output graph geometry and stats
-    Nodes = [g.node[i]["point"] for i in g.nodes()]
-    Edges = [e[2]["line"] for e in g.edges(data=True)]
+    Nodes = g.graph["points"]
+    Edges = [rc.Geometry.Line(Nodes[i],Nodes[n]) for i,n in g.edges()]
     Stats = "Nodes: " + str(len(Nodes)) + "\n" + "Edges: " + str(len(Edges))